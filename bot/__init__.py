@@ -64,6 +64,8 @@ for usr_id in _SUDO_USERS:
 if len(SUDO_USERS) == 0:
     _missing_env_var('SUDO_USERS')
 
+SUDO_USERS = frozenset(SUDO_USERS)
+
 _req_time_regex = re.compile(r'^(\d+)(min|d|s)$')
 
 ENG_REQ_TIME = os.environ.get('ENG_REQ_TIME', '8d').strip()
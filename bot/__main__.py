@@ -1,5 +1,5 @@
-from datetime import datetime
-from pytz import timezone
+from datetime import datetime, timezone
+import pytz
 import os
 from time import sleep
 from typing import List
@@ -142,7 +142,7 @@ async def request_handler(client: Client, message: Message):
         )
         raise ContinuePropagation
 
-    cur_time = datetime.now()
+    cur_time = datetime.now(tz=timezone.utc)
     group_id = int(str(GROUP_ID)[4:])
 
     user_last_request = DB.get_user_last_request(user.id)
@@ -171,7 +171,7 @@ async def request_handler(client: Client, message: Message):
                         f"({format_time_diff(cur_time, user_last_request['req_time'])}) " +\
                         f"was less than {req_time['full']} ago and hence the new one is deleted." +\
                         f"\n\nMuting you for 12 hours." +\
-                        f"\nCome back after {format_time_diff(None, None, time_diff).replace(' ago', '')} (on {appr_time.replace(tzinfo=timezone('Asia/Kolkata')):%d %b} IST)"
+                        f"\nCome back after {format_time_diff(None, None, time_diff).replace(' ago', '')} (on {appr_time.astimezone(pytz.timezone('Asia/Kolkata')):%d %b} IST)"
             )
             allow_request = False
 
@@ -188,7 +188,7 @@ async def request_handler(client: Client, message: Message):
                         f"({format_time_diff(cur_time, user_last_request['fulfill_time'])}) " +\
                         f"less than {req_time['full']} ago and hence the new one is deleted." +\
                         f"\n\nMuting you for 12 hours." +\
-                        f"\nCome back after {format_time_diff(t1=None, t2=None, t_diff=time_diff).replace(' ago', '')} (on {appr_time.replace(tzinfo=timezone('Asia/Kolkata')):%d %b} IST)"
+                        f"\nCome back after {format_time_diff(t1=None, t2=None, t_diff=time_diff).replace(' ago', '')} (on {appr_time.astimezone(pytz.timezone('Asia/Kolkata')):%d %b} IST)"
             )
             allow_request = False
 
@@ -332,4 +332,5 @@ if DB_BACKUP_CHAT_ID != -1:
     )
     scheduler.start()
 
-app.run()
+with DB:
+    app.run()
@@ -7,7 +7,7 @@ from bot import (
     logger
 )
 from bot.filters import CustomFilters
-from bot.helpers.utils import is_admin, is_sudo_user
+from bot.helpers.utils import is_admin, is_sudo_user, clear_main_group_name
 
 app = None
 if SESSION_STRING != '':
@@ -44,3 +44,11 @@ async def start_command(client: Client, message: Message):
     )
 
     raise ContinuePropagation
+
+
+@app.on_message(filters=CustomFilters.group_title_filter)
+async def group_title_handler(_: Client, __: Message):
+
+    clear_main_group_name()
+
+    raise ContinuePropagation
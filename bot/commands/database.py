@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from pyrogram import ContinuePropagation
 from pyrogram.client import Client
 from pyrogram.types.messages_and_media.message import Message
@@ -104,7 +104,7 @@ async def dellastreq_cmd(client: Client, message: Message):
         )
         raise ContinuePropagation
 
-    cur_time = datetime.now()
+    cur_time = datetime.now(tz=timezone.utc)
     group_id = int(str(GROUP_ID)[4:])
 
     DB.delete_request(last_req['message_id'])
@@ -1,7 +1,6 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import os
 import matplotlib.pyplot as plt
-import threading
 
 from pyrogram import ContinuePropagation
 from pyrogram.client import Client
@@ -12,7 +11,7 @@ from bot import ( DB, GROUP_ID, NAME_CACHE, REQ_TIMES, HELP_DATA,
 from bot.client import app
 from bot.filters import CustomFilters
 from bot.helpers.utils import (
-    is_admin, is_sudo_user, get_main_group_name, time_delete_message,
+    is_admin, is_sudo_user, get_main_group_name, schedule_delete_message,
     html_message_link, sort_help_data,
     format_time_diff, format_date, check_time_gap_crossed
 )
@@ -75,11 +74,7 @@ async def requests_cmd(client: Client, message: Message):
                     '2. Reply <code>/userrequests</code> to a user\'s message',
                     quote=True
                 )
-                thread = threading.Thread(
-                    target=time_delete_message,
-                    args=(client,sent_message.chat.id,sent_message.message_id)
-                )
-                thread.start()
+                schedule_delete_message(client, sent_message)
                 raise ContinuePropagation
             else:
                 target_user_id = replied_to.from_user.id
@@ -94,11 +89,7 @@ async def requests_cmd(client: Client, message: Message):
             text='There are no records for the user yet.',
             quote=True
         )
-        thread = threading.Thread(
-            target=time_delete_message,
-            args=(client,sent_message.chat.id,sent_message.message_id)
-        )
-        thread.start()
+        schedule_delete_message(client, sent_message)
         return
 
     ( english_fulfilled, non_english_fulfilled,
@@ -111,7 +102,7 @@ async def requests_cmd(client: Client, message: Message):
 
     if total_requests > 0:
 
-        cur_time = datetime.now()
+        cur_time = datetime.now(tz=timezone.utc)
         group_id = int(str(GROUP_ID)[4:])
 
         english_requests = english_fulfilled + english_not_fulfilled
@@ -146,11 +137,7 @@ async def requests_cmd(client: Client, message: Message):
         text=stats_text,
         quote=True
     )
-    thread = threading.Thread(
-        target=time_delete_message,
-        args=(client,sent_message.chat.id,sent_message.message_id)
-    )
-    thread.start()
+    schedule_delete_message(client, sent_message)
 
     raise ContinuePropagation
 
@@ -176,22 +163,18 @@ async def stats_cmd(client: Client, message: Message):
 
     start_date = None
     total_days = 1
-    curr_date = datetime.now().date()
+    curr_date = datetime.now(tz=timezone.utc).date()
     oldest_req_time = DB.get_oldest_request_time()
     if oldest_req_time is None or not oldest_req_time:
         sent_message = await message.reply_text(
             text="There are no requests in the database currently!",
             quote=True
         )
-        thread = threading.Thread(
-            target=time_delete_message,
-            args=(client,sent_message.chat.id,sent_message.message_id)
-        )
-        thread.start()
+        schedule_delete_message(client, sent_message)
         raise ContinuePropagation
 
     start_time = oldest_req_time[0]
-    start_date = start_time.date()
+    start_date = start_time.astimezone(timezone.utc).date()
     total_days = (curr_date-start_date).days
     if total_days == 0:
         total_days = 1
@@ -232,13 +215,13 @@ async def stats_cmd(client: Client, message: Message):
             if ws.month == we.month
             else f"{ws:%b %d}-{we:%b %d}"
         ) + ")"
-        for (wn,(rc, fc)), (ws, we, _) in zip(weekly_stats.items(),weeks)
+        for (ws, we, wn) in weeks
     ]
     x_requests = [i - bar_width for i in range(1, len(weekly_stats) + 1)]
     x_fulfilled = [i for i in range(1, len(weekly_stats) + 1)]
     x_mid = [i - (bar_width/2) for i in range(1, len(weekly_stats) + 1)]
-    y_requests = [weekly_stats[stat][0] for stat in weekly_stats]
-    y_fulfilled = [weekly_stats[stat][1] for stat in weekly_stats]
+    y_requests = [requests_count for requests_count, _ in weekly_stats]
+    y_fulfilled = [fulfill_count for _, fulfill_count in weekly_stats]
 
     if 5 <= len(weeks) <= 10:
         plt.figure(figsize=(20, 10))
@@ -260,11 +243,7 @@ async def stats_cmd(client: Client, message: Message):
         caption=stats_text,
         quote=True
     )
-    thread = threading.Thread(
-        target=time_delete_message,
-        args=(client,sent_message.chat.id,sent_message.message_id)
-    )
-    thread.start()
+    schedule_delete_message(client, sent_message)
 
     os.remove("./weekly_stats.png")
 
@@ -282,8 +261,6 @@ async def leaderboard_cmd(client: Client, message: Message):
         raise ContinuePropagation
 
     results = DB.get_leaderboard()
-    results = sorted(results)
-    results.reverse()
 
     group_name = await get_main_group_name(client)
 
@@ -291,23 +268,18 @@ async def leaderboard_cmd(client: Client, message: Message):
 
     for pos, result in enumerate(results):
 
-        fulfill_count, user_id = result
-        user_details = NAME_CACHE[user_id] if user_id in NAME_CACHE.keys() else DB.get_user_details(user_id)
+        fulfill_count, user_id, name, _ = result
+        if user_id in NAME_CACHE.keys():
+            name = NAME_CACHE[user_id]['name']
 
-        if user_details is None:
+        if name is None:
             leaderboard_text += f"{pos+1}) <b>[id:{user_id}]</b> ({fulfill_count} filled)\n"
             continue
 
-        name, _ = user_details['name'], user_details['user_name']
-
         leaderboard_text += f'{pos+1}) <a href="tg://user?id={user_id}">{name}</a> ({fulfill_count} filled)\n'
 
     sent_message = await message.reply_text(
         text=leaderboard_text,
         quote=True
     )
-    thread = threading.Thread(
-        target=time_delete_message,
-        args=(client,sent_message.chat.id,sent_message.message_id)
-    )
-    thread.start()
+    schedule_delete_message(client, sent_message)
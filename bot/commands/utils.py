@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timezone
 
 from pyrogram import ContinuePropagation
 from pyrogram.client import Client
@@ -44,7 +44,7 @@ async def pending_cmd(client: Client, message: Message):
     pending_req_text = f'Here are the oldest pending requests:\n\n'
 
     group_id = int(str(GROUP_ID)[4:])
-    cur_time = datetime.now()
+    cur_time = datetime.now(tz=timezone.utc)
 
     for indx,request in enumerate(pending_requests):
 
@@ -83,7 +83,7 @@ async def lastfilled_cmd(client: Client, message: Message):
         raise ContinuePropagation
 
     group_id = int(str(GROUP_ID)[4:])
-    cur_time = datetime.now()
+    cur_time = datetime.now(tz=timezone.utc)
 
     reply_text = "<b>The latest fulfilled request was:</b>\n\n"
     reply_text += f"- <b>Type:</b> {'English' if last_filled_req['is_english'] else 'Non English'}\n\n"
@@ -198,34 +198,37 @@ async def formfulfilled_cmd(client: Client, message: Message):
     if (not await is_sudo_user(user)) and (not await is_owner(client, user)):
         raise ContinuePropagation
 
-    all_requests = DB.get_requests()
-
     group_id = int(str(GROUP_ID)[4:])
 
     errors_message = "ERRORS:\n\n"
     success_message = "SUCCESSES:\n\n"
 
-    for request in all_requests:
+    requests_page = DB.get_requests(limit=500)
+    while len(requests_page) > 0:
+
+        for request in requests_page:
+
+            try:
+                fulfill_message = await client.get_messages(
+                                        chat_id=GROUP_ID,
+                                        message_ids=request['fulfill_message_id']
+                                    )
+            except:
+                fulfill_message = None
 
-        try:
-            fulfill_message = await client.get_messages(
-                                    chat_id=GROUP_ID,
-                                    message_ids=request['fulfill_message_id']
-                                )
-        except:
-            fulfill_message = None
+            if fulfill_message is None:
+                errors_message += f"{html_message_link(group_id, request['fulfill_message_id'], 'nfmsg')} - {html_message_link(group_id, request['message_id'], 'Request')}\n"
+                continue
 
-        if fulfill_message is None:
-            errors_message += f"{html_message_link(group_id, request['fulfill_message_id'], 'nfmsg')} - {html_message_link(group_id, request['message_id'], 'Request')}\n"
-            continue
+            fulfiller = fulfill_message.from_user
+            if fulfiller is None:
+                errors_message += f"{html_message_link(group_id, request['fulfill_message_id'], 'nfmsg')} - {html_message_link(group_id, request['message_id'], 'Request')} - unf\n"
+                continue
 
-        fulfiller = fulfill_message.from_user
-        if fulfiller is None:
-            errors_message += f"{html_message_link(group_id, request['fulfill_message_id'], 'nfmsg')} - {html_message_link(group_id, request['message_id'], 'Request')} - unf\n"
-            continue
+            DB.update_fulfilled_by(fulfill_message.message_id, fulfiller.id)
+            success_message += f"{html_message_link(group_id, request['message_id'], 'Request')} - {html_message_link(group_id, request['fulfill_message_id'], 'fulfilled')} - {fulfiller.mention(fulfiller.first_name)}\n"
 
-        DB.update_fulfilled_by(fulfill_message.message_id, fulfiller.id)
-        success_message += f"{html_message_link(group_id, request['message_id'], 'Request')} - {html_message_link(group_id, request['fulfill_message_id'], 'fulfilled')} - {fulfiller.mention(fulfiller.first_name)}\n"
+        requests_page = DB.get_requests(limit=500, after=requests_page[-1]['message_id'])
 
     await message.reply_text(
         text=errors_message,
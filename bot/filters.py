@@ -30,6 +30,11 @@ class CustomFilters:
         & filters.text
     )
 
+    group_title_filter = (
+        _main_group_filter
+        & filters.new_chat_title
+    )
+
     request_filter = (
         filters.text
         & _main_group_filter
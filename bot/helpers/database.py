@@ -1,726 +1,678 @@
-import os
+import logging
+from contextlib import contextmanager
+from threading import Lock
 from typing import Tuple
 import psycopg2
+import psycopg2.errors
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, connection
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from datetime import datetime, timedelta
-from zipfile import ZipFile
+from zipfile import ZIP_DEFLATED, ZipFile
 
 import pytz
 
 
-class Database:
-
-    def __init__(self, database_url: str):
-        self.connection = psycopg2.connect(database_url)
-        self.create_schema()
+logger = logging.getLogger()
+
+SQL_LISTEN_PENDING_CHANGED = "LISTEN pending_changed;"
+
+SQL_PREPARE_STATEMENTS = (
+    "DEALLOCATE ALL;" +
+    "PREPARE get_user (BIGINT) AS " +
+        "SELECT user_id FROM users WHERE user_id = $1;" +
+    "PREPARE get_user_last_request (BIGINT) AS " +
+        "SELECT " +
+            "user_id, is_english, message_id, req_time," +
+            "fulfill_message_id, fulfill_time " +
+        "FROM requests WHERE user_id = $1 " +
+        "ORDER BY message_id DESC LIMIT 1;" +
+    "PREPARE register_request_fulfillment (BIGINT, BIGINT, BIGINT, BIGINT) AS " +
+        "UPDATE requests " +
+        "SET fulfill_message_id = $1, fulfill_time = now(), fulfilled_by = $2 " +
+        "WHERE (user_id = $3 AND message_id = $4);"
+)
+
+SQL_SAVEPOINT_PREPARED = "SAVEPOINT execute_prepared;"
+
+SQL_ROLLBACK_TO_PREPARED = "ROLLBACK TO SAVEPOINT execute_prepared;"
+
+SQL_CREATE_USERS_TABLE = (
+    "CREATE TABLE IF NOT EXISTS users (" +
+        "user_id        BIGINT       PRIMARY KEY," +
+        "name           TEXT         DEFAULT NULL," +
+        "user_name      TEXT         DEFAULT NULL" +
+    ");"
+)
+
+SQL_CREATE_REQUESTS_TABLE = (
+    "CREATE TABLE IF NOT EXISTS requests (" +
+        "user_id                BIGINT NOT NULL," +
+        "is_english             BOOLEAN NOT NULL," +
+        "message_id             BIGINT PRIMARY KEY DEFAULT NULL," +
+        "req_time               TIMESTAMPTZ NOT NULL DEFAULT now()," +
+        "fulfill_message_id     BIGINT DEFAULT NULL," +
+        "fulfill_time           TIMESTAMPTZ DEFAULT NULL," +
+        "fulfilled_by           BIGINT DEFAULT NULL," +
+        "CONSTRAINT fk_user_id\n" +
+        "   FOREIGN KEY(user_id)\n" +
+        "       REFERENCES users(user_id)\n" +
+        "       ON DELETE CASCADE" +
+    ");"
+)
+
+SQL_GET_NAIVE_TIMESTAMP_COLUMNS = (
+    "SELECT column_name FROM information_schema.columns " +
+    "WHERE table_name = 'requests' " +
+    "AND data_type = 'timestamp without time zone';"
+)
+
+SQL_SET_REQ_TIME_DEFAULT = "ALTER TABLE requests ALTER COLUMN req_time SET DEFAULT now();"
+
+SQL_CREATE_PENDING_TRIGGER = (
+    "CREATE OR REPLACE FUNCTION notify_pending_changed() RETURNS trigger AS $$ " +
+    "BEGIN " +
+    "   NOTIFY pending_changed; " +
+    "   RETURN NULL; " +
+    "END $$ LANGUAGE plpgsql;" +
+    "DROP TRIGGER IF EXISTS requests_pending_changed ON requests;" +
+    "CREATE TRIGGER requests_pending_changed " +
+        "AFTER INSERT OR DELETE OR UPDATE ON requests " +
+        "FOR EACH STATEMENT EXECUTE PROCEDURE notify_pending_changed();" +
+    "DROP TRIGGER IF EXISTS requests_pending_truncated ON requests;" +
+    "CREATE TRIGGER requests_pending_truncated " +
+        "AFTER TRUNCATE ON requests " +
+        "FOR EACH STATEMENT EXECUTE PROCEDURE notify_pending_changed();"
+)
+
+SQL_CREATE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_requests_user_message " +
+        "ON requests (user_id, message_id DESC);" +
+    "CREATE INDEX IF NOT EXISTS idx_requests_req_time " +
+        "ON requests (req_time);" +
+    "CREATE INDEX IF NOT EXISTS idx_requests_fulfill_time " +
+        "ON requests (fulfill_time DESC) " +
+        "WHERE fulfill_time IS NOT NULL;" +
+    "CREATE INDEX IF NOT EXISTS idx_requests_fulfilled_by " +
+        "ON requests (fulfilled_by) " +
+        "WHERE fulfilled_by IS NOT NULL;" +
+    "CREATE INDEX IF NOT EXISTS idx_requests_pending " +
+        "ON requests (req_time) " +
+        "INCLUDE (user_id, is_english, message_id) " +
+        "WHERE fulfill_time IS NULL;"
+)
+
+SQL_DROP_TABLES = (
+    "DROP TABLE IF EXISTS users CASCADE;" +
+    "DROP TABLE IF EXISTS requests;"
+)
+
+SQL_ADD_USER = (
+    "INSERT INTO users (user_id, name, user_name) " +
+    "VALUES (%s, %s, %s);"
+)
+
+SQL_GET_USER_DETAILS = "SELECT user_id, name, user_name FROM users WHERE user_id = %s"
+
+SQL_GET_USER = "EXECUTE get_user (%s);"
+
+SQL_UPDATE_USER = (
+    "UPDATE users " +
+    "SET name = %s, user_name = %s " +
+    "WHERE (user_id = %s);"
+)
+
+SQL_GET_USERS = "SELECT user_id, name, user_name FROM users;"
+
+SQL_GET_USER_LAST_REQUEST = "EXECUTE get_user_last_request (%s);"
+
+SQL_GET_USER_STATS = (
+    "SELECT " +
+        "count(*) FILTER (WHERE is_english AND fulfill_time IS NOT NULL), " +
+        "count(*) FILTER (WHERE NOT is_english AND fulfill_time IS NOT NULL), " +
+        "count(*) FILTER (WHERE is_english AND fulfill_time IS NULL), " +
+        "count(*) FILTER (WHERE NOT is_english AND fulfill_time IS NULL) " +
+    "FROM requests WHERE user_id = %s;"
+)
+
+SQL_GET_GLOBAL_STATS = (
+    "SELECT " +
+        "count(*) FILTER (WHERE is_english AND fulfill_time IS NOT NULL), " +
+        "count(*) FILTER (WHERE NOT is_english AND fulfill_time IS NOT NULL), " +
+        "count(*) FILTER (WHERE is_english AND fulfill_time IS NULL), " +
+        "count(*) FILTER (WHERE NOT is_english AND fulfill_time IS NULL) " +
+    "FROM requests;"
+)
+
+SQL_LIST_REQUESTS = (
+    "SELECT " +
+        "user_id, is_english, message_id, req_time," +
+        "fulfill_message_id, fulfill_time " +
+    "FROM requests WHERE "
+)
+
+SQL_GET_OLDEST_REQUEST_TIME = (
+    "SELECT " +
+        "req_time " +
+    "FROM requests " +
+    "ORDER BY" +
+    "   req_time ASC LIMIT 1;"
+)
+
+SQL_GET_LATEST_FULFILLED = (
+    "SELECT " +
+        "user_id, is_english, message_id, req_time," +
+        "fulfill_message_id, fulfill_time, fulfilled_by " +
+    "FROM requests " +
+    "WHERE fulfill_time is NOT NULL " +
+    "ORDER BY" +
+    "   fulfill_time DESC LIMIT 1;"
+)
+
+SQL_GET_REQUEST = (
+    "SELECT " +
+        "user_id, is_english, message_id, req_time," +
+        "fulfill_message_id, fulfill_time " +
+    "FROM requests WHERE user_id = %s AND message_id = %s;"
+)
+
+SQL_GET_PENDING_REQUESTS = (
+    "SELECT " +
+        "user_id, is_english, message_id, req_time " +
+    "FROM requests " +
+    "WHERE fulfill_time IS NULL " +
+    "ORDER BY req_time;"
+)
+
+SQL_DELETE_REQUEST = "DELETE FROM requests WHERE message_id = %s;"
+
+SQL_REGISTER_REQUESTS = (
+    "INSERT INTO requests (user_id, is_english, message_id) " +
+    "VALUES %s"
+)
+
+SQL_MARK_REQUEST_NOT_DONE = (
+    "UPDATE requests " +
+    "SET fulfill_message_id = NULL, fulfill_time = NULL, fulfilled_by = NULL " +
+    "WHERE (user_id = %s AND message_id = %s);"
+)
+
+SQL_REGISTER_REQUEST_FULFILLMENT = "EXECUTE register_request_fulfillment (%s, %s, %s, %s);"
+
+SQL_GET_SCHEMAS = (
+    "SELECT table_name, column_name, data_type, is_nullable "
+    "FROM information_schema.columns "
+    "WHERE table_name = ANY(%s) "
+    "ORDER BY table_name, ordinal_position;"
+)
+
+SQL_UPDATE_FULFILLED_BY = (
+    "UPDATE requests " +
+    "SET fulfilled_by = %s " +
+    "WHERE fulfill_message_id = %s;"
+)
+
+SQL_GET_LEADERBOARD = (
+    "SELECT COUNT(r.message_id) AS count, r.fulfilled_by, u.name, u.user_name " +
+    "FROM requests r " +
+    "LEFT JOIN users u ON u.user_id = r.fulfilled_by " +
+    "WHERE r.fulfilled_by IS NOT NULL " +
+    "GROUP BY r.fulfilled_by, u.user_id " +
+    "ORDER BY count DESC, r.fulfilled_by DESC;"
+)
+
+SQL_GET_WEEKLY_STATS = (
+    "SELECT " +
+        "w.week_start, " +
+        "count(r.message_id) FILTER (" +
+        "   WHERE r.req_time >= w.week_start AND r.req_time <= w.week_end" +
+        "), " +
+        "count(r.message_id) FILTER (" +
+        "   WHERE r.fulfill_time >= w.week_start AND r.fulfill_time <= w.week_end" +
+        ") " +
+    "FROM (VALUES %s) AS w(week_start, week_end) " +
+    "LEFT JOIN requests r ON " +
+    "   (r.req_time >= w.week_start AND r.req_time <= w.week_end) OR " +
+    "   (r.fulfill_time >= w.week_start AND r.fulfill_time <= w.week_end) " +
+    "GROUP BY w.week_start;"
+)
+
+
+class _PooledConnection(connection):
+    statements_prepared = False
 
-    def __del__(self):
-        self.connection.close()
 
+class Database:
 
-    def create_schema(self):
+    def __init__(self, database_url: str, min_connections: int = 1, max_connections: int = 10):
+        self._pool = ThreadedConnectionPool(
+            min_connections, max_connections, database_url,
+            connection_factory=_PooledConnection
+        )
 
-        cur = self.connection.cursor()
         try:
-            cur.execute(
-                "CREATE TABLE IF NOT EXISTS users (" +
-                    "user_id        BIGINT       PRIMARY KEY," +
-                    "name           TEXT         DEFAULT NULL," +
-                    "user_name      TEXT         DEFAULT NULL" +
-                ");"
-            )
-            cur.execute(
-                "CREATE TABLE IF NOT EXISTS requests (" +
-                    "user_id                BIGINT NOT NULL," +
-                    "is_english             BOOLEAN NOT NULL," +
-                    "message_id             BIGINT PRIMARY KEY DEFAULT NULL," +
-                    "req_time               TIMESTAMP DEFAULT NULL,"
-                    "fulfill_message_id     BIGINT DEFAULT NULL," +
-                    "fulfill_time           TIMESTAMP DEFAULT NULL," +
-                    "fulfilled_by           BIGINT DEFAULT NULL," +
-                    "CONSTRAINT fk_user_id\n" +
-                    "   FOREIGN KEY(user_id)\n" +
-                    "       REFERENCES users(user_id)\n" +
-                    "       ON DELETE CASCADE" +
-                ");"
-            )
+            self._database_url = database_url
+            self._pending_requests = None
+            self._pending_lock = Lock()
+            self._listen()
+
+            self.create_schema()
 
         except Exception as ex:
-            self.connection.rollback()
+            self.close()
             raise ex
 
-        finally:
-            self.connection.commit()
-            cur.close()
+    def __enter__(self):
+        return self
 
+    def __exit__(self, *_):
+        self.close()
 
-    def drop_database(self):
+    def close(self):
+        if hasattr(self, '_listen_connection'):
+            self._listen_connection.close()
+        self._pool.closeall()
 
-        cur = self.connection.cursor()
-        try:
-            cur.execute(
-                "DROP TABLE IF EXISTS users CASCADE;" +
-                "DROP TABLE IF EXISTS requests;"
-            )
 
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
+    def _listen(self):
 
-        finally:
-            self.connection.commit()
-            cur.close()
+        self._listen_connection = psycopg2.connect(
+            self._database_url,
+            keepalives=1, keepalives_idle=60,
+            keepalives_interval=10, keepalives_count=3
+        )
+        self._listen_connection.autocommit = True
+        with self._listen_connection.cursor() as cur:
+            cur.execute(SQL_LISTEN_PENDING_CHANGED)
 
 
-    def add_user(self, user_id: int, name: str, user_name: str):
-        cur = self.connection.cursor()
-        try:
-            cur.execute(
-                "INSERT INTO users (user_id, name, user_name) " +
-                "VALUES (%s, %s, %s);",
-                [user_id, name, user_name]
-            )
+    def _invalidate_pending_requests(self):
 
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
+        with self._pending_lock:
+            self._pending_requests = None
 
-        finally:
-            self.connection.commit()
-            cur.close()
 
+    @contextmanager
+    def _conn(self):
+        '''
+        Borrows a connection from the pool for the duration of the block
 
-    def get_user_details(self, user_id: int):
-        cur = self.connection.cursor()
+        The transaction is committed if the block finishes cleanly and rolled
+        back otherwise, then the connection is returned to the pool
+        '''
+
+        conn = self._pool.getconn()
         try:
-            cur.execute(
-                "SELECT user_id, name, user_name FROM users WHERE user_id = %s",
-                [user_id]
-            )
-            (usr_id, name, user_name) = next(cur, (None, None, None))
+            yield conn
+            conn.commit()
 
         except Exception as ex:
-            self.connection.rollback()
+            conn.rollback()
             raise ex
 
         finally:
-            cur.close()
+            self._pool.putconn(conn)
 
-        return {
-            "user_id": usr_id,
-            "name": name,
-            "user_name": user_name
-        } if usr_id is not None else None
 
+    def _prepare_statements(self, conn: _PooledConnection):
 
-    def get_user(self, user_id: int):
-        cur = self.connection.cursor()
-        try:
-            cur.execute(
-                "SELECT user_id FROM users WHERE user_id = %s",
-                [user_id]
-            )
-            (usr_id) = next(cur, (None))
+        with conn.cursor() as cur:
+            cur.execute(SQL_PREPARE_STATEMENTS)
+        conn.statements_prepared = True
 
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
 
-        finally:
-            cur.close()
+    def _execute_prepared(self, conn: _PooledConnection, cur, query: str, params: list):
+        '''
+        Runs an `EXECUTE` of one of the hot path prepared statements
 
-        return usr_id
+        The statements are prepared on the connection the first time it is
+        used here, and prepared again if they have since been deallocated
+        (e.g. by a `DISCARD ALL` sent through /sqlquery)
 
+        This never commits. If the `EXECUTE` is the first statement of the
+        transaction a failed attempt is simply rolled back, otherwise it runs
+        under a savepoint so the caller's earlier statements survive the retry
+        '''
+
+        first_statement = conn.get_transaction_status() == TRANSACTION_STATUS_IDLE
+
+        if not conn.statements_prepared:
+            self._prepare_statements(conn)
+
+        if not first_statement:
+            cur.execute(SQL_SAVEPOINT_PREPARED)
 
-    def update_user(self, user_id: int, name: str, username: str):
-        cur = self.connection.cursor()
         try:
-            cur.execute(
-                "UPDATE users " +
-                "SET name = %s, user_name = %s " +
-                "WHERE (user_id = %s);",
-                [name, username, user_id]
-            )
+            cur.execute(query, params)
 
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
+        except psycopg2.errors.InvalidSqlStatementName:
+            if first_statement:
+                conn.rollback()
+            else:
+                cur.execute(SQL_ROLLBACK_TO_PREPARED)
+            self._prepare_statements(conn)
+            cur.execute(query, params)
 
-        finally:
-            cur.close()
 
+    def create_schema(self):
 
-    def get_users(self):
-        cur = self.connection.cursor()
-        try:
-            cur.execute(
-                "SELECT user_id, name, user_name FROM users;"
-            )
-            results = cur.fetchall()
+        with self._conn() as conn, conn.cursor() as cur:
+            cur.execute(SQL_CREATE_USERS_TABLE)
+            cur.execute(SQL_CREATE_REQUESTS_TABLE)
 
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
+            # Tables created before the switch to TIMESTAMPTZ store naive timestamps
+            cur.execute(SQL_GET_NAIVE_TIMESTAMP_COLUMNS)
+            for (column_name,) in cur.fetchall():
+                cur.execute(
+                    f"ALTER TABLE requests ALTER COLUMN {column_name} TYPE TIMESTAMPTZ;"
+                )
+            cur.execute(SQL_SET_REQ_TIME_DEFAULT)
+            cur.execute(SQL_CREATE_PENDING_TRIGGER)
 
-        finally:
-            cur.close()
+            cur.execute(SQL_CREATE_INDEXES)
 
-        return {
-            result[0]: {"name": result[1], "user_name": result[2]}
-            for result in results
-        }
 
+    def drop_database(self):
 
-    def get_user_last_request(self, user_id: int):
+        with self._conn() as conn, conn.cursor() as cur:
+            cur.execute(SQL_DROP_TABLES)
 
-        cur = self.connection.cursor()
-        try:
-            cur.execute(
-                "SELECT " +
-                    "user_id, is_english, message_id, req_time," +
-                    "fulfill_message_id, fulfill_time " +
-                "FROM requests WHERE user_id = %s " +
-                "ORDER BY " +
-                "   message_id DESC " +
-                "LIMIT 1;",
-                [user_id]
-            )
+        self._invalidate_pending_requests()
 
-            ( usr_id, is_english, msg_id,
-            req_time, fulfill_message_id, fulfill_time ) = next(cur, (None, None, None, None, None, None))
-
-            last_request = {
-                'user_id': usr_id,
-                'is_english': is_english,
-                'message_id': msg_id,
-                'req_time': req_time,
-                'fulfill_message_id': fulfill_message_id,
-                'fulfill_time': fulfill_time
-            }
 
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
+    def add_user(self, user_id: int, name: str, user_name: str):
+        with self._conn() as conn, conn.cursor() as cur:
+            cur.execute(SQL_ADD_USER, [user_id, name, user_name])
 
-        finally:
-            cur.close()
 
-        return last_request
+    def get_user_details(self, user_id: int):
+        with self._conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(SQL_GET_USER_DETAILS, [user_id])
+            user_details = cur.fetchone()
 
+        return user_details
 
-    def get_user_stats(self, user_id: int) -> Tuple[int, int, int, int]:
 
-        cur = self.connection.cursor()
-        try:
-            cur.execute(
-                "WITH new_table AS (" +
-                "   SELECT " +
-                "       is_english," +
-                "       (fulfill_time IS NOT NULL) AS is_fulfilled " +
-                "   FROM requests WHERE user_id = %s" +
-                ") "
-                "SELECT " +
-                    "is_fulfilled, is_english, COUNT(is_english) AS cnt " +
-                "FROM new_table " +
-                "GROUP BY is_english, is_fulfilled;",
-                [user_id]
-            )
+    def get_user(self, user_id: int):
+        with self._conn() as conn, conn.cursor() as cur:
+            self._execute_prepared(conn, cur, SQL_GET_USER, [user_id])
+            (usr_id) = next(cur, (None))
 
-            ( english_fulfilled, non_english_fulfilled,
-            english_not_fulfilled, non_english_not_fulfilled ) = 0, 0, 0, 0
+        return usr_id
 
-            while True:
 
-                (is_fulfilled, is_english, req_count) = next(cur, (None, None, None))
-                if is_fulfilled is None or is_english is None or req_count is None:
-                    break
+    def update_user(self, user_id: int, name: str, username: str):
+        with self._conn() as conn, conn.cursor() as cur:
+            cur.execute(SQL_UPDATE_USER, [name, username, user_id])
 
-                if is_fulfilled:
-                    if is_english:
-                        english_fulfilled = req_count
-                    else:
-                        non_english_fulfilled = req_count
-                else:
-                    if is_english:
-                        english_not_fulfilled = req_count
-                    else:
-                        non_english_not_fulfilled = req_count
 
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
+    def get_users(self):
+        with self._conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(SQL_GET_USERS)
+            users = {
+                result['user_id']: {"name": result['name'], "user_name": result['user_name']}
+                for result in cur
+            }
 
-        finally:
-            cur.close()
+        return users
 
-        return ( english_fulfilled, non_english_fulfilled,
-        english_not_fulfilled, non_english_not_fulfilled )
 
+    def get_user_last_request(self, user_id: int):
 
-    def get_global_stats(self) -> Tuple[int, int, int, int]:
+        with self._conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            self._execute_prepared(conn, cur, SQL_GET_USER_LAST_REQUEST, [user_id])
+
+            last_request = cur.fetchone()
+            if last_request is None:
+                last_request = {column.name: None for column in cur.description}
+
+        return last_request
 
-        cur = self.connection.cursor()
-        try:
-            cur.execute(
-                "WITH new_table AS (" +
-                "   SELECT " +
-                "       is_english," +
-                "       (fulfill_time IS NOT NULL) AS is_fulfilled " +
-                "   FROM requests" +
-                ") "
-                "SELECT " +
-                    "is_fulfilled, is_english, COUNT(is_english) AS cnt " +
-                "FROM new_table " +
-                "GROUP BY is_english, is_fulfilled;"
-            )
+
+    def get_user_stats(self, user_id: int) -> Tuple[int, int, int, int]:
+
+        with self._conn() as conn, conn.cursor() as cur:
+            cur.execute(SQL_GET_USER_STATS, [user_id])
 
             ( english_fulfilled, non_english_fulfilled,
-            english_not_fulfilled, non_english_not_fulfilled ) = 0, 0, 0, 0
+            english_not_fulfilled, non_english_not_fulfilled ) = cur.fetchone()
 
-            while True:
+        return ( english_fulfilled, non_english_fulfilled,
+        english_not_fulfilled, non_english_not_fulfilled )
 
-                (is_fulfilled, is_english, req_count) = next(cur, (None, None, None))
-                if is_fulfilled is None or is_english is None or req_count is None:
-                    break
 
-                if is_fulfilled:
-                    if is_english:
-                        english_fulfilled = req_count
-                    else:
-                        non_english_fulfilled = req_count
-                else:
-                    if is_english:
-                        english_not_fulfilled = req_count
-                    else:
-                        non_english_not_fulfilled = req_count
+    def get_global_stats(self) -> Tuple[int, int, int, int]:
 
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
+        with self._conn() as conn, conn.cursor() as cur:
+            cur.execute(SQL_GET_GLOBAL_STATS)
 
-        finally:
-            cur.close()
+            ( english_fulfilled, non_english_fulfilled,
+            english_not_fulfilled, non_english_not_fulfilled ) = cur.fetchone()
 
         return ( english_fulfilled, non_english_fulfilled,
         english_not_fulfilled, non_english_not_fulfilled )
 
 
-    def get_user_requests(self, user_id: int):
+    def _list_requests(self, where_sql: str, params: list, limit: int = None, after: int = None):
+        '''
+        Lists the requests matching `where_sql` ordered by message id
 
-        cur = self.connection.cursor()
-        try:
-            cur.execute(
-                "SELECT " +
-                    "user_id, is_english, message_id, req_time," +
-                    "fulfill_message_id, fulfill_time " +
-                "FROM requests WHERE user_id = %s " +
-                "ORDER BY" +
-                "   message_id ASC;",
-                [user_id]
-            )
-            user_requests = []
-            while True:
-                ( usr_id, is_english, msg_id,
-                req_time, fulfill_message_id, fulfill_time ) = next(cur, (None, None, None, None, None, None))
-                if usr_id is None:
-                    break
+        Pass the last seen message id as `after` along with a `limit` to page
+        through the results. The whole page is loaded into memory, so large
+        listings should be paged
+        '''
 
-                user_requests.append(( usr_id, is_english, msg_id,
-                req_time, fulfill_message_id, fulfill_time ))
+        query = SQL_LIST_REQUESTS + where_sql
+        if after is not None:
+            query += " AND message_id > %s"
+            params = params + [after]
+        query += " ORDER BY message_id ASC"
+        if limit is not None:
+            query += " LIMIT %s"
+            params = params + [limit]
 
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
+        with self._conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(query, params)
+            requests = cur.fetchall()
 
-        finally:
-            cur.close()
-
-        user_requests = [
-            {
-                'user_id': req[0],
-                'is_english': req[1],
-                'message_id': req[2],
-                'req_time': req[3],
-                'fulfill_message_id': req[4],
-                'fulfill_time': req[5]
-            }
-            for req in user_requests
-        ]
+        return requests
 
-        return user_requests
+
+    def get_user_requests(self, user_id: int, limit: int = None, after: int = None):
+        return self._list_requests("user_id = %s", [user_id], limit=limit, after=after)
 
 
     def get_oldest_request_time(self):
 
-        cur = self.connection.cursor()
-        try:
-            cur.execute(
-                "SELECT " +
-                    "req_time " +
-                "FROM requests " +
-                "ORDER BY" +
-                "   req_time ASC LIMIT 1;"
-            )
+        with self._conn() as conn, conn.cursor() as cur:
+            cur.execute(SQL_GET_OLDEST_REQUEST_TIME)
 
             (req_time) = next(cur, (None))
 
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
-
-        finally:
-            cur.close()
-
         return req_time
 
 
     def get_latest_fulfilled(self):
 
-        cur = self.connection.cursor()
-        try:
-            cur.execute(
-                "SELECT " +
-                    "user_id, is_english, message_id, req_time," +
-                    "fulfill_message_id, fulfill_time, fulfilled_by " +
-                "FROM requests " +
-                "WHERE fulfill_time is NOT NULL " +
-                "ORDER BY" +
-                "   fulfill_time DESC LIMIT 1;"
-            )
+        with self._conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(SQL_GET_LATEST_FULFILLED)
 
-            ( usr_id, is_english, msg_id,
-            req_time, fulfill_message_id, fulfill_time,
-            fulfilled_by ) = next(cur, (None, None, None, None, None, None, None))
-
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
+            latest_fulfilled = cur.fetchone()
+            if latest_fulfilled is None:
+                latest_fulfilled = {column.name: None for column in cur.description}
 
-        finally:
-            cur.close()
-
-        return {
-            'user_id': usr_id,
-            'is_english': is_english,
-            'message_id': msg_id,
-            'req_time': req_time,
-            'fulfill_message_id': fulfill_message_id,
-            'fulfill_time': fulfill_time,
-            'fulfilled_by': fulfilled_by
-        }
+        return latest_fulfilled
 
 
     def get_request(self, user_id: int, message_id: int):
-        cur = self.connection.cursor()
-        try:
-            cur.execute(
-                "SELECT " +
-                    "user_id, is_english, message_id, req_time," +
-                    "fulfill_message_id, fulfill_time " +
-                "FROM requests WHERE user_id = %s AND message_id = %s;",
-                [user_id, message_id]
-            )
+        with self._conn() as conn, conn.cursor() as cur:
+            cur.execute(SQL_GET_REQUEST, [user_id, message_id])
             ( usr_id, is_english, msg_id,
             req_time, fulfill_message_id, fulfill_time ) = next(cur, (None, None, None, None, None, None));
 
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
-
-        finally:
-            cur.close()
-
         return ( usr_id, is_english, msg_id,
         req_time, fulfill_message_id, fulfill_time )
 
 
-    def get_requests(self):
-        cur = self.connection.cursor()
-        try:
-            cur.execute(
-                "SELECT " +
-                    "user_id, is_english, message_id, req_time," +
-                    "fulfill_message_id, fulfill_time " +
-                "FROM requests;",
-            )
-            requests = []
-            while True:
-                ( usr_id, is_english, msg_id,
-                req_time, fulfill_message_id, fulfill_time ) = next(cur, (None, None, None, None, None, None))
-                if usr_id is None:
-                    break
-
-                requests.append(( usr_id, is_english, msg_id,
-                req_time, fulfill_message_id, fulfill_time ))
-
-
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
-
-        finally:
-            cur.close()
-
-        requests = [
-                    {
-                        'user_id': req[0],
-                        'is_english': req[1],
-                        'message_id': req[2],
-                        'req_time': req[3],
-                        'fulfill_message_id': req[4],
-                        'fulfill_time': req[5]
-                    }
-                    for req in requests
-                ]
-        return requests
+    def get_requests(self, limit: int = None, after: int = None):
+        return self._list_requests("TRUE", [], limit=limit, after=after)
 
 
     def get_pending_requests(self):
+        '''
+        Returns the pending requests, oldest first
+
+        The list is cached and only queried again after a `pending_changed`
+        notification, which the requests table trigger sends on every change,
+        or after this process writes to the requests table itself. If the
+        LISTEN connection is lost it is reopened and the list is re-queried
+        '''
+
+        with self._pending_lock:
+            try:
+                self._listen_connection.poll()
+                if self._listen_connection.notifies:
+                    self._listen_connection.notifies.clear()
+                    self._pending_requests = None
+
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as ex:
+                logger.warning(f'Lost the pending_changed listener, reconnecting: {ex}')
+                self._pending_requests = None
+                self._listen_connection.close()
+                try:
+                    self._listen()
+                except (psycopg2.OperationalError, psycopg2.InterfaceError) as ex:
+                    logger.warning(f'Could not re-listen on pending_changed: {ex}')
+
+            if self._pending_requests is None:
+                with self._conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    cur.execute(SQL_GET_PENDING_REQUESTS)
+                    self._pending_requests = cur.fetchall()
+
+            return self._pending_requests
 
-        cur = self.connection.cursor()
-        try:
-            cur.execute(
-                "SELECT " +
-                    "user_id, is_english, message_id, req_time " +
-                "FROM requests " +
-                "WHERE fulfill_time is NULL " +
-                "ORDER BY req_time;"
-            )
-            pending_requests = []
-            while True:
-                ( usr_id, is_english, msg_id,
-                req_time ) = next(cur, (None, None, None, None))
-                if usr_id is None:
-                    break
-
-                pending_requests.append(( usr_id, is_english, msg_id,
-                req_time ))
 
+    def delete_request(self, message_id: int):
+        with self._conn() as conn, conn.cursor() as cur:
+            cur.execute(SQL_DELETE_REQUEST, [message_id])
 
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
-
-        finally:
-            cur.close()
-
-        pending_requests = [
-                    {
-                        'user_id': req[0],
-                        'is_english': req[1],
-                        'message_id': req[2],
-                        'req_time': req[3]
-                    }
-                    for req in pending_requests
-                ]
-        return pending_requests
-
+        self._invalidate_pending_requests()
 
-    def delete_request(self, message_id: int):
-        cur = self.connection.cursor()
-        try:
-            cur.execute(
-                "DELETE FROM requests WHERE message_id = %s;",
-                [message_id]
-            )
 
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
+    def register_request(self, user_id: int, is_english: bool, message_id: int):
+        self.register_requests([(user_id, is_english, message_id)])
 
-        finally:
-            self.connection.commit()
-            cur.close()
 
+    def register_requests(self, requests):
+        '''
+        Registers many requests in one statement
 
-    def register_request(self, user_id: int, is_english: bool, message_id: int):
-        cur = self.connection.cursor()
-        try:
-            cur.execute(
-                "INSERT INTO requests (user_id, is_english, message_id, req_time) " +
-                "VALUES (%s, %s, %s, %s)",
-                [user_id, is_english, message_id, datetime.now()]
-            )
+        `requests` is a list of (user_id, is_english, message_id) tuples
+        '''
 
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
+        with self._conn() as conn, conn.cursor() as cur:
+            execute_values(cur, SQL_REGISTER_REQUESTS, requests, page_size=500)
 
-        finally:
-            self.connection.commit()
-            cur.close()
+        self._invalidate_pending_requests()
 
 
     def mark_request_not_done(self, user_id: int, message_id: int):
 
-        cur = self.connection.cursor()
-        try:
-            cur.execute(
-                "UPDATE requests " +
-                "SET fulfill_message_id = NULL, fulfill_time = NULL, fulfilled_by = NULL " +
-                "WHERE (user_id = %s AND message_id = %s);",
-                [user_id, message_id]
-            )
-
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
+        with self._conn() as conn, conn.cursor() as cur:
+            cur.execute(SQL_MARK_REQUEST_NOT_DONE, [user_id, message_id])
 
-        finally:
-            self.connection.commit()
-            cur.close()
+        self._invalidate_pending_requests()
 
 
     def register_request_fulfillment(self, user_id: int, message_id: int, fulfill_id: int, fulfilled_by: int):
 
-        cur = self.connection.cursor()
-        try:
-            cur.execute(
-                "UPDATE requests " +
-                "SET fulfill_message_id = %s, fulfill_time = %s, fulfilled_by = %s " +
-                "WHERE (user_id = %s AND message_id = %s);",
-                [fulfill_id, datetime.now(), fulfilled_by, user_id, message_id]
+        with self._conn() as conn, conn.cursor() as cur:
+            self._execute_prepared(
+                conn, cur, SQL_REGISTER_REQUEST_FULFILLMENT,
+                [fulfill_id, fulfilled_by, user_id, message_id]
             )
 
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
-
-        finally:
-            self.connection.commit()
-            cur.close()
+        self._invalidate_pending_requests()
 
 
     def run_qeury(self, query: str, op=False):
 
-        cur = self.connection.cursor()
-        try:
+        with self._conn() as conn, conn.cursor() as cur:
             cur.execute( query )
             if op:
                 output = cur.fetchall()
             else:
                 output = None
 
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
-
-        finally:
-            self.connection.commit()
-            cur.close()
+        self._invalidate_pending_requests()
 
         return output
 
 
     def get_schemas(self):
 
-        query = (
-            "SELECT column_name, data_type, is_nullable "
-            "FROM information_schema.columns "
-            "WHERE table_name = %s;"
-        )
-
-        cur = self.connection.cursor()
-        try:
-            cur.execute( query, ["users"])
-            output1 = cur.fetchall()
-            cur.execute( query, ["requests"])
-            output2 = cur.fetchall()
-
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
+        schemas = {
+            "users": [],
+            "requests": []
+        }
 
-        finally:
-            self.connection.commit()
-            cur.close()
+        with self._conn() as conn, conn.cursor() as cur:
+            cur.execute(SQL_GET_SCHEMAS, [list(schemas.keys())])
+            for table_name, *column in cur:
+                schemas[table_name].append(tuple(column))
 
-        return output1, output2
+        return schemas["users"], schemas["requests"]
 
 
     def update_fulfilled_by(self, fulfill_message_id, fulfilled_by):
 
-        cur = self.connection.cursor()
-        try:
-            cur.execute(
-                "UPDATE requests " +
-                "SET fulfilled_by = %s " +
-                "WHERE fulfill_message_id = %s;",
-                [fulfilled_by, fulfill_message_id]
-            )
-
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
-
-        finally:
-            self.connection.commit()
-            cur.close()
+        with self._conn() as conn, conn.cursor() as cur:
+            cur.execute(SQL_UPDATE_FULFILLED_BY, [fulfilled_by, fulfill_message_id])
 
 
     def get_leaderboard(self):
 
-        cur = self.connection.cursor()
-        try:
-            cur.execute(
-                "SELECT COUNT(message_id) AS count, fulfilled_by " +
-                "FROM requests " +
-                "WHERE fulfilled_by IS NOT NULL " +
-                "GROUP BY fulfilled_by " +
-                "ORDER BY count DESC;"
-            )
+        with self._conn() as conn, conn.cursor() as cur:
+            cur.execute(SQL_GET_LEADERBOARD)
             result = cur.fetchall()
 
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
-
-        finally:
-            self.connection.commit()
-            cur.close()
-
         return result
 
 
     def get_weekly_stats(self, weeks):
+        '''
+        Returns a (requests_count, fulfill_count) tuple for every week, in the
+        same order as `weeks`
+        '''
+
+        if len(weeks) == 0:
+            return []
+
+        with self._conn() as conn, conn.cursor() as cur:
+            counts = execute_values(
+                cur,
+                SQL_GET_WEEKLY_STATS,
+                [
+                    (week_start, week_end + timedelta(days=1))
+                    for week_start, week_end, _ in weeks
+                ],
+                page_size=len(weeks),
+                fetch=True
+            )
 
-        cur = self.connection.cursor()
-        results = {}
-        try:
-            for week in weeks:
-                week_start, week_end, week_number = week
-                week_end = week_end + timedelta(days=1)
-
-                cur.execute(
-                    "SELECT count(message_id) FROM requests " +
-                    "WHERE req_time >= %s AND req_time <= %s;",
-                    [week_start, week_end]
-                )
-                requests_count = cur.fetchone()[0]
-
-                cur.execute(
-                    "SELECT count(message_id) FROM requests " +
-                    "WHERE fulfill_time >= %s AND fulfill_time <= %s;",
-                    [week_start, week_end]
-                )
-                fulfill_count = cur.fetchone()[0]
-
-                results[week_number] = (requests_count, fulfill_count)
-
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
-
-        finally:
-            self.connection.commit()
-            cur.close()
+        counts = {
+            week_start: (requests_count, fulfill_count)
+            for week_start, requests_count, fulfill_count in counts
+        }
 
-        return results
+        return [
+            counts.get(week_start, (0, 0))
+            for week_start, _, _ in weeks
+        ]
 
 
     def get_backup_data(self):
 
-        cur = self.connection.cursor()
-
         table_names = [
             "users",
             "requests"
@@ -728,40 +680,13 @@ class Database:
         cur_time = datetime.now(tz=pytz.timezone('Asia/Kolkata'))
         zip_file_name = f"database_backup_{cur_time:%d-%m-%Y-%H:%M:%S}.zip"
 
-        def format_data(val):
-            if val is None:
-                return 'NULL'
-            elif isinstance(val, datetime):
-                return f"{val:'%Y-%m-%d %H:%M:%S'}"
-            else:
-                return repr(val)
-
-        try:
-            zipObj = ZipFile(zip_file_name, "w")
-            for table_name in table_names:
-                cur.execute(
-                    f"SELECT * FROM {table_name};"
-                )
-                columns = [_.name for _ in cur.description]
-                insert_prefix = f'INSERT INTO {table_name} ({", ".join(columns)}) VALUES'
-                table_data = cur.fetchall()
-                with open(f"{table_name}.sql", "w") as f:
-                    for row in table_data:
-                        row_data = [format_data(val) for val in row]
-                        f.write(f"{insert_prefix} ({', '.join(row_data)});\n")
-
-                zipObj.write(f"{table_name}.sql")
-            zipObj.close()
-
-            os.remove("users.sql")
-            os.remove("requests.sql")
-
-        except Exception as ex:
-            self.connection.rollback()
-            raise ex
-
-        finally:
-            self.connection.commit()
-            cur.close()
+        with self._conn() as conn, conn.cursor() as cur:
+            with ZipFile(zip_file_name, "w", compression=ZIP_DEFLATED) as zipObj:
+                for table_name in table_names:
+                    with zipObj.open(f"{table_name}.csv", "w", force_zip64=True) as table_file:
+                        cur.copy_expert(
+                            f"COPY {table_name} TO STDOUT WITH (FORMAT csv, HEADER true);",
+                            table_file
+                        )
 
         return zip_file_name
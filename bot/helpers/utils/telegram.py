@@ -1,29 +1,42 @@
-from time import time, sleep
+import asyncio
+from time import time
+from cachetools import TTLCache
 from pyrogram.client import Client
 from pyrogram.types.messages_and_media.message import Message
 from pyrogram.types.user_and_chats.chat_member import ChatMember
 from pyrogram.types.user_and_chats.chat_permissions import ChatPermissions
 from pyrogram.types.user_and_chats.user import User
 
-from bot import ( GROUP_ID, SUDO_USERS )
+from bot import ( GROUP_ID, SUDO_USERS, logger )
 
 
-async def is_admin(client: Client, user: User):
+_LINK_ENTITY_TYPES = frozenset(("url", "text_link"))
+
+_member_status_cache = TTLCache(maxsize=4096, ttl=60)
+
+
+async def _get_member_status(client: Client, user: User):
+
+    status = _member_status_cache.get(user.id)
+    if status is not None:
+        return status
 
     membership: ChatMember = await client.get_chat_member(
                                 chat_id=GROUP_ID,
                                 user_id=user.id
                             )
-    return membership.status in ['administrator', 'creator']
+    _member_status_cache[user.id] = membership.status
+    return membership.status
+
+
+async def is_admin(client: Client, user: User):
+
+    return (await _get_member_status(client, user)) in ['administrator', 'creator']
 
 
 async def is_owner(client: Client, user: User):
 
-    membership: ChatMember = await client.get_chat_member(
-                                chat_id=GROUP_ID,
-                                user_id=user.id
-                            )
-    return membership.status == 'creator'
+    return (await _get_member_status(client, user)) == 'creator'
 
 
 async def is_sudo_user(user: User):
@@ -31,10 +44,22 @@ async def is_sudo_user(user: User):
     return user.id in SUDO_USERS
 
 
+_main_group_name = None
+
+
 async def get_main_group_name(client: Client):
 
-    chat = await client.get_chat(chat_id=GROUP_ID)
-    return chat.title
+    global _main_group_name
+    if _main_group_name is None:
+        chat = await client.get_chat(chat_id=GROUP_ID)
+        _main_group_name = chat.title
+    return _main_group_name
+
+
+def clear_main_group_name():
+
+    global _main_group_name
+    _main_group_name = None
 
 
 def get_message_media(message: Message):
@@ -68,21 +93,27 @@ def has_link(message: Message):
     if entities is None:
         return False
 
-    return_value = False
+    return any(entity.type in _LINK_ENTITY_TYPES for entity in entities)
+
+_delete_message_tasks = set()
 
-    for entity in entities:
 
-        if entity.type not in ["url", "text_link"]:
-            continue
+async def time_delete_message(client: Client, group_id: int, message_id: int):
 
-        return_value = True
+    await asyncio.sleep(5*60)
+    try:
+        await client.delete_messages(
+            chat_id=group_id,
+            message_ids=message_id,
+        )
+    except Exception as ex:
+        logger.warning(f'Failed to delete message {message_id} in {group_id}: {ex}')
 
-    return return_value
 
-def time_delete_message(client: Client, group_id: int, message_id: int):
+def schedule_delete_message(client: Client, message: Message):
 
-    sleep(5*60)
-    _ = client.delete_messages(
-        chat_id=group_id,
-        message_ids=message_id,
+    task = asyncio.create_task(
+        time_delete_message(client, message.chat.id, message.message_id)
     )
+    _delete_message_tasks.add(task)
+    task.add_done_callback(_delete_message_tasks.discard)
@@ -8,10 +8,12 @@ def check_time_gap_crossed(curr_time: datetime, old_time: datetime, gap):
     Returns True/False along with the appropriate time when the gap will be crossed
     '''
 
+    old_time = old_time.astimezone(curr_time.tzinfo)
+
     if gap['type'] == 'd':
         time_diff = curr_time.date() - old_time.date()
         time_change = timedelta(days=gap['value'])
-        appropriate_time = datetime.combine(old_time.date() + time_change, datetime.min.time())
+        appropriate_time = datetime.combine(old_time.date() + time_change, datetime.min.time(), tzinfo=old_time.tzinfo)
         return time_diff.days >= gap['value'], appropriate_time
 
     elif gap['type'] == 'min':
@@ -27,7 +29,7 @@ def check_time_gap_crossed(curr_time: datetime, old_time: datetime, gap):
         appropriate_time = (old_time + time_change)
         return time_diff.seconds >= gap['value'], appropriate_time
 
-    return True, datetime.now()
+    return True, datetime.now(tz=curr_time.tzinfo)
 
 
 def format_date(d: date):